@@ -47,15 +47,14 @@ def update_def_href(surface, def_name, def_dict):
 
 
 def parse_all_defs(surface, node):
-    """Recursively visit all child nodes and process definition elements."""
-
-    # Handle node
-    parse_def(surface, node)
-
-    # Visit all children recursively
-    if node.children:
-        for child in node.children:
-            parse_all_defs(surface, child)
+    """Visit all child nodes and process definition elements."""
+    # Walk the tree with a stack rather than recursively, keeping the
+    # document order so that later definitions override earlier ones
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        parse_def(surface, node)
+        nodes.extend(reversed(node.children))
 
 
 def parse_def(surface, node):
@@ -4,6 +4,8 @@ Surface helpers.
 """
 
 import re
+from functools import lru_cache
+from itertools import zip_longest
 from math import atan2, cos, hypot, radians, sin, tan
 
 from .surface import cairo
@@ -315,18 +317,17 @@ def pop_rotation(node, original_rotate, rotate):
 
 
 def zip_letters(xl, yl, dxl, dyl, rl, word):
-    """Returns a list with the current letter's positions (x, y and rotation).
+    """Returns the positions (x, y, dx, dy and rotation) of each letter.
 
     E.g.: for letter 'L' with positions x = 10, y = 20 and rotation = 30:
-    >>> [[10, 20, 30], 'L']
+    >>> ((10, 20, None, None, 30), 'L')
 
-    Store the last value of each position and pop the first one in order to
-    avoid setting an x,y or rotation value that have already been used.
+    Missing positions are ``None``, except rotations: the last given rotation
+    is used for the following letters.
 
     """
-    return (
-        ([pl.pop(0) if pl else None for pl in (xl, yl, dxl, dyl, rl)], char)
-        for char in word)
+    rl = rl + rl[-1:] * (len(word) - len(rl))
+    return zip(zip_longest(xl, yl, dxl, dyl, rl), word)
 
 
 def flatten(node):
@@ -361,30 +362,39 @@ def size(surface, string, reference='xy'):
     if surface is None:
         return 0
 
+    return unit_size(
+        string, reference, surface.font_size, surface.dpi,
+        surface.context_width, surface.context_height)
+
+
+@lru_cache(maxsize=4096)
+def unit_size(string, reference, font_size, dpi, context_width,
+              context_height):
+    """Replace a ``string`` with units by a float value, see ``size``."""
     string = normalize(string).split(' ', 1)[0]
     if string.endswith('%'):
         if reference == 'x':
-            reference = surface.context_width or 0
+            reference = context_width or 0
         elif reference == 'y':
-            reference = surface.context_height or 0
+            reference = context_height or 0
         elif reference == 'xy':
             reference = (
-                hypot(surface.context_width, surface.context_height) / 2 ** .5
+                hypot(context_width, context_height) / 2 ** .5
             )
         return float(string[:-1]) * reference / 100
     elif string.endswith('em'):
-        return surface.font_size * float(string[:-2])
+        return font_size * float(string[:-2])
     elif string.endswith('ex'):
         # Assume that 1em == 2ex
-        return surface.font_size * float(string[:-2]) / 2
+        return font_size * float(string[:-2]) / 2
     elif string.endswith('ch'):
         # A '0' must be assumed to be 0.5em wide.
-        return surface.font_size * float(string[:-2]) / 2
+        return font_size * float(string[:-2]) / 2
 
     for unit, coefficient in UNITS.items():
         if string.endswith(unit):
             number = float(string[:-len(unit)])
-            return number * (surface.dpi * coefficient if coefficient else 1)
+            return number * (dpi * coefficient if coefficient else 1)
 
     # Unknown size
     return 0
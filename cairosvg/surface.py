@@ -15,7 +15,7 @@ from .defs import (
     parse_all_defs, pattern, prepare_filter, radial_gradient, use)
 from .helpers import (
     UNITS, PointError, clip_rect, node_format, normalize, paint,
-    preserve_ratio, size, transform)
+    preserve_ratio, size, transform, unit_size)
 from .image import image, invert_image
 from .parser import Tree
 from .path import draw_markers, path
@@ -159,6 +159,10 @@ class Surface(object):
         self.cursor_d_position = [0, 0]
         self.text_path_width = 0
         self.tree_cache = {(tree.url, tree.get('id')): tree}
+        # Text nodes are laid out twice, once to build their path and once
+        # more to be filled, these caches keep what both passes share
+        self.text_extents_cache = {}
+        self.text_path_cache = {}
         if parent_surface:
             self.markers = parent_surface.markers
             self.gradients = parent_surface.gradients
@@ -178,7 +182,8 @@ class Surface(object):
         self._old_parent_node = self.parent_node = None
         self.output = output
         self.dpi = dpi
-        self.font_size = size(self, '12pt')
+        self.font_size = unit_size(
+            '12pt', 'xy', None, dpi, parent_width, parent_height)
         self.stroke_and_fill = True
         width, height, viewbox = node_format(self, tree)
         if viewbox is None:
@@ -488,6 +493,7 @@ class Surface(object):
             self.cursor_position = [0, 0]
             self.cursor_d_position = [0, 0]
             self.text_path_width = 0
+            self.text_extents_cache.clear()
 
         self.context.restore()
         self.parent_node = old_parent_node
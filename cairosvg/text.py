@@ -3,111 +3,209 @@ Text drawers.
 
 """
 
-from math import cos, radians, sin
+from bisect import bisect_left
+from functools import lru_cache
+from math import atan2, cos, hypot, radians, sin
 
 from .bounding_box import (
     EMPTY_BOUNDING_BOX, extend_bounding_box, is_valid_bounding_box)
-from .helpers import distance, normalize, point_angle, size, zip_letters
+from .helpers import normalize, point_angle, size, zip_letters
 from .surface import cairo
 from .url import parse_url
 
+FONT_SLANTS = {
+    'italic': cairo.FONT_SLANT_ITALIC,
+    'normal': cairo.FONT_SLANT_NORMAL,
+    'oblique': cairo.FONT_SLANT_OBLIQUE,
+}
 
-def path_length(path):
-    """Get the length of ``path``."""
-    total_length = 0
-    for item in path:
-        if item[0] == cairo.PATH_MOVE_TO:
-            old_point = item[1]
-        elif item[0] == cairo.PATH_LINE_TO:
-            new_point = item[1]
-            length = distance(
-                old_point[0], old_point[1], new_point[0], new_point[1])
-            total_length += length
-            old_point = new_point
-    return total_length
+FONT_WEIGHTS = {
+    'bold': cairo.FONT_WEIGHT_BOLD,
+    'normal': cairo.FONT_WEIGHT_NORMAL,
+}
+
+MARKER_ATTRIBUTES = ('marker', 'marker-start', 'marker-mid', 'marker-end')
+
+TEXT_ANCHORS = {
+    'middle': lambda width, x_bearing, spacing: (
+        - (width / 2 + x_bearing) - spacing / 2),
+    'end': lambda width, x_bearing, spacing: (
+        - (width + x_bearing) - spacing),
+}
+
+DISPLAY_ANCHORS = {
+    'middle': lambda height, y_bearing: -height / 2 - y_bearing,
+    'top': lambda height, y_bearing: -y_bearing,
+    'bottom': lambda height, y_bearing: -height - y_bearing,
+}
 
+ALIGNMENT_BASELINES = {
+    # TODO: This is wrong, Cairo gives no reasonable access to x-height
+    # information, so we use font top-to-bottom
+    'central': lambda ascent, descent: (ascent + descent) / 2 - descent,
+    'middle': lambda ascent, descent: (ascent + descent) / 2 - descent,
+    'text-before-edge': lambda ascent, descent: ascent,
+    'before_edge': lambda ascent, descent: ascent,
+    'top': lambda ascent, descent: ascent,
+    'hanging': lambda ascent, descent: ascent,
+    'text-top': lambda ascent, descent: ascent,
+    'text-after-edge': lambda ascent, descent: -descent,
+    'after_edge': lambda ascent, descent: -descent,
+    'bottom': lambda ascent, descent: -descent,
+    'text-bottom': lambda ascent, descent: -descent,
+}
 
-def point_following_path(path, width):
-    """Get the point at ``width`` distance on ``path``."""
+
+def path_segments(path):
+    """Get the segments of ``path`` and their cumulated lengths.
+
+    Segments are ``(start_point, (cos, sin), length)`` tuples, where ``cos``
+    and ``sin`` give the direction of the segment.
+
+    """
+    segments, lengths = [], []
     total_length = 0
-    for item in path:
-        if item[0] == cairo.PATH_MOVE_TO:
-            old_point = item[1]
-        elif item[0] == cairo.PATH_LINE_TO:
-            new_point = item[1]
-            length = distance(
-                old_point[0], old_point[1], new_point[0], new_point[1])
+    # This loop runs for each segment of flattened curves, it avoids helper
+    # calls and attribute lookups
+    move_to, line_to = cairo.PATH_MOVE_TO, cairo.PATH_LINE_TO
+    for item_type, points in path:
+        if item_type == move_to:
+            old_x, old_y = points
+        elif item_type == line_to:
+            new_x, new_y = points
+            delta_x, delta_y = new_x - old_x, new_y - old_y
+            length = hypot(delta_x, delta_y)
             total_length += length
-            if total_length < width:
-                old_point = new_point
-            else:
-                length -= total_length - width
-                angle = point_angle(
-                    old_point[0], old_point[1], new_point[0], new_point[1])
-                x = cos(angle) * length + old_point[0]
-                y = sin(angle) * length + old_point[1]
-                return x, y
+            angle = atan2(delta_y, delta_x)
+            segments.append(
+                ((old_x, old_y), (cos(angle), sin(angle)), length))
+            lengths.append(total_length)
+            old_x, old_y = new_x, new_y
+    return segments, lengths
+
+
+def points_following_path(segments, lengths, widths):
+    """Get the points at ``widths`` distances on the path made of ``segments``.
+
+    ``segments`` and ``lengths`` are given by ``path_segments``. When
+    ``widths`` are increasing, each point is searched after the previous one.
+    Points beyond the end of the path are ``None``.
+
+    """
+    points = []
+    index, last_width = 0, float('-inf')
+    for width in widths:
+        if width < last_width:
+            index = 0
+        index = bisect_left(lengths, width, index)
+        last_width = width
+        if index == len(segments):
+            points.append(None)
+            continue
+        old_point, (cos_angle, sin_angle), length = segments[index]
+        length -= lengths[index] - width
+        x = cos_angle * length + old_point[0]
+        y = sin_angle * length + old_point[1]
+        points.append((x, y))
+    return points
+
+
+@lru_cache(maxsize=128)
+def toy_font_face(font_family, font_style, font_weight):
+    """Get the Cairo font face matching the given font properties."""
+    family = (font_family or 'sans-serif').split(',')[0].strip('"\' ')
+    slant = FONT_SLANTS.get(
+        (font_style or '').lower(), cairo.FONT_SLANT_NORMAL)
+    if font_weight and font_weight.isdigit() and int(font_weight) >= 550:
+        font_weight = 'bold'
+    weight = FONT_WEIGHTS.get(
+        (font_weight or '').lower(), cairo.FONT_WEIGHT_NORMAL)
+    return cairo.ToyFontFace(family, slant, weight)
+
+
+@lru_cache(maxsize=1024)
+def split_values(string):
+    """Split a ``string`` corresponding to an array of various values."""
+    return tuple(normalize(string).split(' '))
+
+
+def sizes(surface, node, attribute, reference):
+    """Get the list of sizes given by ``attribute`` on a text ``node``."""
+    if attribute not in node:
+        return []
+    return [
+        size(surface, value, reference)
+        for value in split_values(node[attribute])]
+
+
+def text_extents(surface, font_key, string):
+    """Get the extents of ``string`` drawn with the ``font_key`` font."""
+    key = (font_key, string)
+    if key not in surface.text_extents_cache:
+        surface.text_extents_cache[key] = surface.context.text_extents(string)
+    return surface.text_extents_cache[key]
+
+
+def move_cursor(surface, x, y, dx, dy):
+    """Move the text cursor according to the first given positions."""
+    x = x[0] if x else surface.cursor_position[0]
+    y = y[0] if y else surface.cursor_position[1]
+    dx = dx[0] if dx else 0
+    dy = dy[0] if dy else 0
+    surface.cursor_position = (x + dx, y + dy)
 
 
 def text(surface, node, draw_as_text=False):
     """Draw a text ``node``."""
-    font_family = (
-        (node.get('font-family') or 'sans-serif').split(',')[0].strip('"\' '))
-    font_style = getattr(
-        cairo, f'font_slant_{node.get("font-style")}'.upper(),
-        cairo.FONT_SLANT_NORMAL)
-    node_font_weight = node.get('font-weight')
-    if (node_font_weight and node_font_weight.isdigit()
-            and int(node_font_weight) >= 550):
-        node_font_weight = 'bold'
-    font_weight = getattr(
-        cairo, (f'font_weight_{node_font_weight}'.upper()),
-        cairo.FONT_WEIGHT_NORMAL)
-    surface.context.select_font_face(font_family, font_style, font_weight)
+    # The referenced path is looked for on the node and on its parent
+    if not hasattr(node, 'text_path_id'):
+        node.text_path_id = parse_url(
+            node.get_href() or node.parent.get_href() or '').fragment
+    if node.text_path_id:
+        text_path = surface.paths.get(node.text_path_id)
+    else:
+        text_path = None
+
+    x = sizes(surface, node, 'x', 'x')
+    y = sizes(surface, node, 'y', 'y')
+    dx = sizes(surface, node, 'dx', 'x')
+    dy = sizes(surface, node, 'dy', 'y')
+
+    if not node.text and not text_path:
+        # Nothing to draw, only move the cursor
+        move_cursor(surface, x, y, dx, dy)
+        return
+
+    font_face = toy_font_face(
+        node.get('font-family'), node.get('font-style'),
+        node.get('font-weight'))
+    surface.context.set_font_face(font_face)
     surface.context.set_font_size(surface.font_size)
+    matrix = surface.context.get_matrix().as_tuple()
+    font_key = (
+        font_face, surface.font_size, matrix,
+        surface.context.get_font_options())
     ascent, descent, _, max_x_advance, max_y_advance = (
         surface.context.font_extents())
 
-    text_path_href = parse_url(node.get_href() or node.parent.get_href() or '')
-    if text_path_href.fragment:
-        text_path = surface.paths.get(text_path_href.fragment)
-    else:
-        text_path = None
     letter_spacing = size(surface, node.get('letter-spacing'))
-    x_bearing, y_bearing, width, height = (
-        surface.context.text_extents(node.text)[:4])
-
-    x, y, dx, dy, rotate = [], [], [], [], [0]
-    if 'x' in node:
-        x = [size(surface, i, 'x')
-             for i in normalize(node['x']).strip().split(' ')]
-    if 'y' in node:
-        y = [size(surface, i, 'y')
-             for i in normalize(node['y']).strip().split(' ')]
-    if 'dx' in node:
-        dx = [size(surface, i, 'x')
-              for i in normalize(node['dx']).strip().split(' ')]
-    if 'dy' in node:
-        dy = [size(surface, i, 'y')
-              for i in normalize(node['dy']).strip().split(' ')]
+
+    rotate = [0]
     if 'rotate' in node:
         rotate = [radians(float(i)) if i else 0
-                  for i in normalize(node['rotate']).strip().split(' ')]
-    last_r = rotate[-1]
+                  for i in split_values(node['rotate'])]
     letters_positions = zip_letters(x, y, dx, dy, rotate, node.text)
 
     x_align = 0
     y_align = 0
 
     text_anchor = node.get('text-anchor')
-    if text_anchor == 'middle':
-        x_align = - (width / 2 + x_bearing)
-        if letter_spacing and node.text:
-            x_align -= (len(node.text) - 1) * letter_spacing / 2
-    elif text_anchor == 'end':
-        x_align = - (width + x_bearing)
+    if text_anchor in TEXT_ANCHORS:
+        spacing = 0
         if letter_spacing and node.text:
-            x_align -= (len(node.text) - 1) * letter_spacing
+            spacing = (len(node.text) - 1) * letter_spacing
+        x_bearing, _, width, _ = text_extents(surface, font_key, node.text)[:4]
+        x_align = TEXT_ANCHORS[text_anchor](width, x_bearing, spacing)
 
     # TODO: This is a hack. The rest of the baseline alignment tags of the SVG
     # 1.1 spec (section 10.9.2) are not supported. We only try to align things
@@ -120,61 +218,67 @@ def text(surface, node, draw_as_text=False):
         display_anchor = node.get('display-anchor')
         alignment_baseline = (node.get('dominant-baseline') or
                               node.get('alignment-baseline'))
-        if display_anchor == 'middle':
-            y_align = -height / 2 - y_bearing
-        elif display_anchor == 'top':
-            y_align = -y_bearing
-        elif display_anchor == 'bottom':
-            y_align = -height - y_bearing
-        elif (alignment_baseline == 'central' or
-              alignment_baseline == 'middle'):
-            # TODO: This is wrong, Cairo gives no reasonable access to x-height
-            # information, so we use font top-to-bottom
-            y_align = (ascent + descent) / 2 - descent
-        elif (alignment_baseline == 'text-before-edge' or
-              alignment_baseline == 'before_edge' or
-              alignment_baseline == 'top' or
-              alignment_baseline == 'hanging' or
-              alignment_baseline == 'text-top'):
-            y_align = ascent
-        elif (alignment_baseline == 'text-after-edge' or
-              alignment_baseline == 'after_edge' or
-              alignment_baseline == 'bottom' or
-              alignment_baseline == 'text-bottom'):
-            y_align = -descent
-
-    bounding_box = EMPTY_BOUNDING_BOX
+        if display_anchor in DISPLAY_ANCHORS:
+            _, y_bearing, _, height = (
+                text_extents(surface, font_key, node.text)[:4])
+            y_align = DISPLAY_ANCHORS[display_anchor](height, y_bearing)
+        elif alignment_baseline in ALIGNMENT_BASELINES:
+            y_align = ALIGNMENT_BASELINES[alignment_baseline](ascent, descent)
+
+    # Points are gathered and added to the bounding box once all the letters
+    # are laid out
+    bounding_points = []
     if text_path:
         surface.context.new_path()
-        surface.stroke_and_fill = False
-        surface.draw(text_path)
-        surface.stroke_and_fill = True
-        cairo_path = surface.context.copy_path_flat()
-        surface.context.new_path()
-        length = path_length(cairo_path) + x_bearing
+        path_key = (node.text_path_id, matrix)
+        cached_path, segments, lengths = surface.text_path_cache.get(
+            path_key, (None, None, None))
+        # Paths with markers are always drawn, as their markers are painted
+        has_markers = any(
+            attribute in text_path for attribute in MARKER_ATTRIBUTES)
+        if cached_path is not text_path or has_markers:
+            surface.stroke_and_fill = False
+            surface.draw(text_path)
+            surface.stroke_and_fill = True
+            cairo_path = surface.context.copy_path_flat()
+            surface.context.new_path()
+            segments, lengths = path_segments(cairo_path)
+            surface.text_path_cache[path_key] = text_path, segments, lengths
+        x_bearing = text_extents(surface, font_key, node.text)[0]
+        length = (lengths[-1] if lengths else 0) + x_bearing
         start_offset = size(surface, node.get('startOffset', 0), length)
         if node.tag == 'textPath':
             surface.text_path_width += start_offset
         surface.text_path_width += x_align
-        bounding_box = extend_bounding_box(bounding_box, ((start_offset, 0),))
+        bounding_points.append((start_offset, 0))
 
     if node.text:
+        # Only the transformation matrix changes for each letter, setting the
+        # initial matrix back is enough to undo it
+        initial_matrix = cairo.Matrix(*matrix)
+        cursor_d_position = surface.cursor_d_position
+        draw_letter = (
+            surface.context.show_text if draw_as_text
+            else surface.context.text_path)
+        letters_extents = {
+            letter: text_extents(surface, font_key, letter)
+            for letter in set(node.text)}
+        spaces = [letter.isspace() for letter in node.text]
         for i, ((x, y, dx, dy, r), letter) in enumerate(letters_positions):
             if x:
-                surface.cursor_d_position[0] = 0
+                cursor_d_position[0] = 0
             if y:
-                surface.cursor_d_position[1] = 0
-            surface.cursor_d_position[0] += dx or 0
-            surface.cursor_d_position[1] += dy or 0
-            text_extents = surface.context.text_extents(letter)
-            extents = text_extents[4]
+                cursor_d_position[1] = 0
+            cursor_d_position[0] += dx or 0
+            cursor_d_position[1] += dy or 0
+            letter_extents = letters_extents[letter]
+            extents = letter_extents[4]
             if text_path:
-                start = surface.text_path_width + surface.cursor_d_position[0]
-                start_point = point_following_path(cairo_path, start)
+                start = surface.text_path_width + cursor_d_position[0]
                 middle = start + extents / 2
-                middle_point = point_following_path(cairo_path, middle)
                 end = start + extents
-                end_point = point_following_path(cairo_path, end)
+                start_point, middle_point, end_point = points_following_path(
+                    segments, lengths, (start, middle, end))
                 if i:
                     extents += letter_spacing
                 surface.text_path_width += extents
@@ -182,51 +286,50 @@ def text(surface, node, draw_as_text=False):
                     continue
                 if not 0 <= middle <= length:
                     continue
-                surface.context.save()
-                surface.context.translate(*start_point)
-                surface.context.rotate(point_angle(*(start_point + end_point)))
-                surface.context.translate(0, surface.cursor_d_position[1])
+                # Translate to the start point, rotate along the path and
+                # shift by the vertical offset with a single transformation
+                angle = point_angle(*(start_point + end_point))
+                cos_angle, sin_angle = cos(angle), sin(angle)
+                surface.context.transform(cairo.Matrix(
+                    cos_angle, sin_angle, -sin_angle, cos_angle,
+                    start_point[0] - sin_angle * cursor_d_position[1],
+                    start_point[1] + cos_angle * cursor_d_position[1]))
                 surface.context.move_to(0, 0)
-                bounding_box = extend_bounding_box(
-                    bounding_box, ((end_point[0], text_extents[3]),))
+                bounding_points.append((end_point[0], letter_extents[3]))
             else:
-                surface.context.save()
                 x = surface.cursor_position[0] if x is None else x
                 y = surface.cursor_position[1] if y is None else y
                 if i:
                     x += letter_spacing
                 surface.context.move_to(x, y)
                 cursor_position = x + extents, y
-                surface.context.rel_move_to(*surface.cursor_d_position)
+                surface.context.rel_move_to(*cursor_d_position)
                 surface.context.rel_move_to(x_align, y_align)
-                surface.context.rotate(last_r if r is None else r)
-                points = (
+                if r:
+                    surface.context.rotate(r)
+                bounding_points.extend((
                     (cursor_position[0] + x_align +
-                     surface.cursor_d_position[0],
+                     cursor_d_position[0],
                      cursor_position[1] + y_align +
-                     surface.cursor_d_position[1]),
-                    (cursor_position[0] + x_align + text_extents[4] +
-                     surface.cursor_d_position[0],
-                     cursor_position[1] + y_align + text_extents[3] +
-                     surface.cursor_d_position[1]))
-                bounding_box = extend_bounding_box(bounding_box, points)
+                     cursor_d_position[1]),
+                    (cursor_position[0] + x_align + letter_extents[4] +
+                     cursor_d_position[0],
+                     cursor_position[1] + y_align + letter_extents[3] +
+                     cursor_d_position[1])))
 
             # Only draw characters with 'content' (workaround for bug in cairo)
-            if not letter.isspace():
-                if draw_as_text:
-                    surface.context.show_text(letter)
-                else:
-                    surface.context.text_path(letter)
-            surface.context.restore()
+            if not spaces[i]:
+                draw_letter(letter)
+            if text_path or r:
+                surface.context.set_matrix(initial_matrix)
             if not text_path:
                 surface.cursor_position = cursor_position
     else:
-        x = x[0] if x else surface.cursor_position[0]
-        y = y[0] if y else surface.cursor_position[1]
-        dx = dx[0] if dx else 0
-        dy = dy[0] if dy else 0
-        surface.cursor_position = (x + dx, y + dy)
+        move_cursor(surface, x, y, dx, dy)
 
     # If a valid bounding box is calculated store it in the node
-    if is_valid_bounding_box(bounding_box):
-        node['text_bounding_box'] = bounding_box
+    if bounding_points:
+        bounding_box = extend_bounding_box(
+            EMPTY_BOUNDING_BOX, bounding_points)
+        if is_valid_bounding_box(bounding_box):
+            node['text_bounding_box'] = bounding_box
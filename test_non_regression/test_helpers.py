@@ -3,6 +3,9 @@ CairoSVG helpers tests.
 
 """
 
+from math import hypot
+from types import SimpleNamespace
+
 from . import cairosvg
 
 helpers = cairosvg.helpers
@@ -29,3 +32,42 @@ def test_normalize():
     helpers.normalize('-12.e3  13E-8.1,') == '-12.e3 13e-8.1'
     helpers.normalize('.1.2-.2e3.2.13E-8.1.1\n') == (
         '.1 .2 -.2e3.2 .13e-8.1 .1')
+
+
+def test_size():
+    """Test ``helpers.size``."""
+    surface = SimpleNamespace(
+        font_size=10, dpi=96, context_width=200, context_height=100)
+    assert helpers.size(surface, '') == 0
+    assert helpers.size(surface, '12') == 12
+    assert helpers.size(surface, '2em') == 20
+    assert helpers.size(surface, '2em') == 20
+    assert helpers.size(surface, '50%', 'x') == 100
+    assert helpers.size(surface, '50%', 'y') == 50
+    assert helpers.size(surface, '72pt') == 96
+    assert helpers.size(surface, '72pt') == 96
+
+    surface.font_size = 20
+    assert helpers.size(surface, '2em') == 40
+    surface.context_width, surface.context_height = 400, 300
+    assert helpers.size(surface, '50%', 'x') == 200
+    assert helpers.size(surface, '50%', 'y') == 150
+    assert helpers.size(surface, '100%') == hypot(400, 300) / 2 ** .5
+    surface.dpi = 72
+    assert helpers.size(surface, '72pt') == 72
+    assert helpers.size(surface, '2em') == 40
+
+
+def test_zip_letters():
+    """Test ``helpers.zip_letters``."""
+    x, y, dx, dy, rotate = [1], [2, 3, 4, 5], [], [6], [7, 8]
+    assert list(helpers.zip_letters(x, y, dx, dy, rotate, 'abc')) == [
+        ((1, 2, None, 6, 7), 'a'),
+        ((None, 3, None, None, 8), 'b'),
+        ((None, 4, None, None, 8), 'c')]
+    # Given lists are not consumed
+    assert (x, y, dx, dy, rotate) == ([1], [2, 3, 4, 5], [], [6], [7, 8])
+    assert list(helpers.zip_letters([], [], [], [], [0], 'ab')) == [
+        ((None, None, None, None, 0), 'a'),
+        ((None, None, None, None, 0), 'b')]
+    assert list(helpers.zip_letters([1, 2], [3], [], [], [0], '')) == []